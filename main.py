@@ -1,8 +1,44 @@
+import csv
+import hashlib
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
 import streamlit as st
+from streamlit.runtime.uploaded_file_manager import UploadedFile
+import numpy as np
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
 
+# Polars is optioneel: alleen gebruikt als het geïnstalleerd is én ROC_SAXION_POLARS=1 is gezet.
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+USE_POLARS = pl is not None and os.environ.get('ROC_SAXION_POLARS') == '1'
+
+# Eerder ingelezen uploads bewaren we als Parquet, zodat dezelfde bestanden in een volgende sessie niet opnieuw geparsed worden.
+# De map mag altijd leeggemaakt worden; bestanden die PARQUET_CACHE_MAX_AGE_DAYS niet gebruikt zijn ruimen we zelf op.
+# Verhoog PARQUET_CACHE_VERSION bij elke wijziging aan het inlezen of opschonen, zodat oude frames niet meer geserveerd worden.
+PARQUET_CACHE_DIR = Path.home() / '.cache' / 'roc-saxion'
+PARQUET_CACHE_VERSION = 1
+PARQUET_CACHE_MAX_AGE_DAYS = 30
+
+# st.cache_data is gedeeld door alle sessies in het proces. Omdat elke nieuwe upload (file_id) een eigen
+# sleutel krijgt, begrenzen we het aantal bewaarde frames; de Parquet-cache maakt opnieuw laden goedkoop.
+LOADER_CACHE_ENTRIES = 4
+LOADER_CACHE_TTL = 3600
+# De afgeleide caches (filters, aggregaties, tabel) bewaren per selectie een kopie; de CSV-export is groter.
+SELECTION_CACHE_ENTRIES = 32
+CSV_CACHE_ENTRIES = 4
+
+# Tekstkolommen met veel herhaalde waarden; als category worden filters en groupby's integer-vergelijkingen.
+CATEGORY_COLUMNS = ['Herkomst naam instelling', 'HO naam instelling', 'HO naam opleiding', 'Herkomst onderwijssoort']
+
 # Pagina configuratie
 st.set_page_config(page_title="Monitor Doorstroom Twente-Saxion", layout="wide")
 
@@ -22,27 +58,250 @@ uploaded_files = st.sidebar.file_uploader(
     accept_multiple_files=True
 )
 
-@st.cache_data
-def load_and_combine_data(files):
-    all_data = []
+def detect_delimiter(file):
+    # We bepalen het scheidingsteken aan de hand van de eerste 8 KB van het bestand.
+    # DUO exporteert standaard met ';', dus dat is ook de terugvaloptie.
+    sample = file.getvalue()[:8192].decode('iso-8859-1')
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=';,\t|').delimiter
+    except csv.Error:
+        return ';'
+
+def read_duo_csv(file, delim):
+    # 'iso-8859-1' is de standaard voor veel Nederlandse CSV's.
+    # De pyarrow-engine is bij grote DUO-bestanden een stuk sneller dan de C-engine;
+    # is pyarrow niet beschikbaar of lukt het parsen niet, dan vallen we terug op de C-engine.
+    try:
+        return pd.read_csv(file, sep=delim, encoding='iso-8859-1', engine='pyarrow', dtype_backend='pyarrow')
+    except (ImportError, ValueError):
+        file.seek(0)
+        return pd.read_csv(file, sep=delim, encoding='iso-8859-1')
+
+def load_with_polars(files, delim):
+    # Polars leest alle bestanden in en voegt ze samen voordat er één keer naar pandas
+    # wordt omgezet; de Arrow-buffers worden daarbij zonder kopie hergebruikt.
+    # Geeft ook terug of alle bestanden gelukt zijn; alleen een volledige set mag in de Parquet-cache.
+    frames = []
     for file in files:
         try:
-            # We voegen 'encoding' toe. 'iso-8859-1' is de standaard voor veel Nederlandse CSV's.
-            # Daarnaast dwingen we sep=';' af, wat de standaard is voor DUO exports.
-            df = pd.read_csv(file, sep=';', encoding='iso-8859-1')
-            all_data.append(df)
+            # Aantal en Jaar als tekst inlezen: een niet-numerieke cel na de eerste 1000 rijen zou anders
+            # het hele bestand laten mislukken. De cast hieronder maakt er net als in het pandas-pad 0 van.
+            frames.append(pl.read_csv(file.getvalue(), separator=delim,
+                                      encoding='iso-8859-1', infer_schema_length=1000,
+                                      schema_overrides={'Aantal': pl.String, 'Jaar': pl.String}))
         except Exception as e:
             st.error(f"Fout bij laden van {file.name}: {e}")
-    
-    if all_data:
-        combined = pd.concat(all_data, ignore_index=True)
-        # Opschonen van de kolommen
-        combined['Aantal'] = pd.to_numeric(combined['Aantal'], errors='coerce').fillna(0)
-        combined['Jaar'] = pd.to_numeric(combined['Jaar'], errors='coerce').fillna(0).astype(int)
-        return combined
-    return None
+
+    if not frames:
+        return None, False
+    combined = pl.concat(frames, how='diagonal_relaxed').with_columns(
+        pl.col('Aantal').cast(pl.Int64, strict=False).fill_null(0),
+        pl.col('Jaar').cast(pl.Int64, strict=False).fill_null(0),
+    )
+    return combined.to_pandas(use_pyarrow_extension_array=True), len(frames) == len(files)
+
+def combine_frames(all_data):
+    # Eén bestand hoeft niet samengevoegd te worden.
+    if len(all_data) == 1:
+        return all_data[0]
+    # Wijken de kolommen af, dan laten we pd.concat het uitlijnen doen.
+    cols = all_data[0].columns
+    if not all(df.columns.equals(cols) for df in all_data[1:]):
+        return pd.concat(all_data, ignore_index=True)
+
+    # Bij gelijke kolommen voegen we per kolom samen zodat er maar één keer gealloceerd wordt.
+    # Door de kolommen uit de losse frames te poppen geven we het geheugen direct weer vrij.
+    columns = {}
+    for c in cols:
+        parts = [df.pop(c) for df in all_data]
+        if all(isinstance(part.dtype, np.dtype) for part in parts):
+            columns[c] = np.concatenate([part.to_numpy() for part in parts])
+        else:
+            # Arrow-kolommen houden zo hun dtype in plaats van terug te vallen op object.
+            columns[c] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns, copy=False)
+
+def write_parquet_cache(combined, cache_path):
+    # Via een uniek tijdelijk bestand, zodat sessies (threads in hetzelfde proces) elkaar niet in de weg
+    # zitten en niemand een half geschreven Parquet-bestand leest.
+    # Lukt het schrijven niet (geen pyarrow, geen schrijfrechten, een type dat Parquet niet kent),
+    # dan werkt de app gewoon zonder deze cache.
+    tmp_path = None
+    try:
+        PARQUET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=PARQUET_CACHE_DIR, suffix='.tmp', delete=False) as tmp:
+            tmp_path = Path(tmp.name)
+        combined.to_parquet(tmp_path, engine='pyarrow', compression='zstd')
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+        return
+    prune_parquet_cache()
+
+def prune_parquet_cache():
+    # Verwijdert cachebestanden (en achtergebleven tijdelijke bestanden) die lang niet gebruikt zijn.
+    cutoff = time.time() - PARQUET_CACHE_MAX_AGE_DAYS * 24 * 3600
+    for path in [*PARQUET_CACHE_DIR.glob('*.parquet'), *PARQUET_CACHE_DIR.glob('*.tmp')]:
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+# Een upload herkennen we aan naam, grootte en file_id. Zo hoeft Streamlit bij een rerun niet de volledige
+# bestandsinhoud te hashen om te zien dat de uploads ongewijzigd zijn; file_id blijft gelijk over reruns,
+# maar verandert bij elke nieuwe upload, ook als een aangepast bestand dezelfde naam en grootte heeft.
+def upload_fingerprint(file):
+    return (file.name, file.size, file.file_id)
+
+@st.cache_data(hash_funcs={UploadedFile: upload_fingerprint}, max_entries=LOADER_CACHE_ENTRIES, ttl=LOADER_CACHE_TTL)
+def load_and_combine_data(files):
+    if not files:
+        return None
+
+    # De vingerafdruk is gebaseerd op de inhoud, zodat hernoemde of opnieuw gedownloade bestanden de cache ook raken.
+    # Cacheversie en inleespad (Polars of pandas) tellen mee, omdat ze het resulterende schema bepalen.
+    digest = hashlib.md5(f"v{PARQUET_CACHE_VERSION}:{'polars' if USE_POLARS else 'pandas'}".encode())
+    for file in files:
+        digest.update(hashlib.md5(file.getvalue()).digest())
+    cache_path = PARQUET_CACHE_DIR / f"{digest.hexdigest()}.parquet"
+    if cache_path.exists():
+        try:
+            cached = pd.read_parquet(cache_path, engine='pyarrow')
+            # Gebruik markeren, zodat het opruimen alleen echt ongebruikte bestanden verwijdert.
+            os.utime(cache_path)
+            return cached
+        except Exception:
+            # Onleesbaar of onvolledig cachebestand: gewoon opnieuw inlezen.
+            pass
+
+    # De DUO-bestanden van verschillende jaren delen hetzelfde formaat, dus we detecteren
+    # het scheidingsteken één keer op het eerste bestand en gebruiken het voor alle uploads.
+    delim = detect_delimiter(files[0])
+
+    if USE_POLARS:
+        combined, complete = load_with_polars(files, delim)
+    else:
+        # Elk bestand wordt op een eigen thread geparsed; pandas geeft de GIL vrij tijdens het tokenizen.
+        # Iedere thread krijgt een eigen BytesIO, zodat ze niet dezelfde bestandspositie delen.
+        def read_upload(file):
+            try:
+                return read_duo_csv(BytesIO(file.getvalue()), delim), None
+            except Exception as e:
+                return None, e
+
+        max_workers = min(len(files), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            results = list(ex.map(read_upload, files))
+
+        # Foutmeldingen tonen we vanaf de hoofdthread; st-aanroepen vanuit een worker-thread verschijnen niet.
+        all_data = []
+        complete = True
+        for file, (df, error) in zip(files, results):
+            if error is not None:
+                st.error(f"Fout bij laden van {file.name}: {error}")
+                complete = False
+            else:
+                all_data.append(df)
+        combined = combine_frames(all_data) if all_data else None
+
+    if combined is None:
+        return None
+    # Opschonen van de kolommen
+    combined['Aantal'] = pd.to_numeric(combined['Aantal'], errors='coerce').fillna(0).astype(np.int32)
+    combined['Jaar'] = pd.to_numeric(combined['Jaar'], errors='coerce').fillna(0).astype(np.int16)
+    # Alle kolommen Arrow-backed, ook na de terugval op de C-engine: tekst neemt dan minder geheugen in
+    # dan object-dtype en plotly kan de Arrow-buffers direct lezen. Zonder pyarrow houden we numpy-dtypes.
+    try:
+        combined = combined.convert_dtypes(dtype_backend='pyarrow')
+    except ImportError:
+        pass
+    for c in CATEGORY_COLUMNS:
+        combined[c] = combined[c].astype('category')
+
+    if complete:
+        write_parquet_cache(combined, cache_path)
+    return combined
+
+herkomst_col = 'Herkomst naam instelling'
+bestemming_col = 'HO naam instelling'
+
+# Keuzelijsten voor de sidebar; bij category-kolommen zijn de categorieën al uniek en zonder NaN.
+@st.cache_data(max_entries=SELECTION_CACHE_ENTRIES)
+def column_options(_data, data_key, col):
+    if isinstance(_data[col].dtype, pd.CategoricalDtype):
+        return _data[col].cat.categories.sort_values().tolist()
+    return sorted(_data[col].dropna().unique())
+
+# Posities van de opties waarin de zoekterm voorkomt, voor de standaardselectie in de sidebar.
+@st.cache_data(max_entries=SELECTION_CACHE_ENTRIES)
+def matching_options(_options, data_key, col, zoekterm):
+    return [i for i, name in enumerate(_options) if zoekterm in name]
+
+# De data komt al uit de cache; hashen van het hele frame zou elke rerun een volledige scan kosten.
+# Daarom slaat Streamlit '_data' over en dient data_key (de set uploads) als cachesleutel.
+@st.cache_data(max_entries=SELECTION_CACHE_ENTRIES)
+def filter_data(_data, data_key, herkomst, ho_list):
+    filtered_df = _data[_data[herkomst_col] == herkomst]
+    ho_subset = filtered_df[filtered_df[bestemming_col].isin(ho_list)]
+    return filtered_df, ho_subset
+
+# Posities per jaar; Jaar heeft maar een paar waarden, dus daarna is elke jaarselectie één .take().
+def group_years(df):
+    return {int(jaar): idx for jaar, idx in df.groupby('Jaar', observed=True).indices.items()}
+
+def rows_for_year(df, year_groups, jaar):
+    return df.take(year_groups.get(jaar, np.array([], dtype=np.intp)))
+
+# Alle groupby's voor KPI's en grafieken in één gecachete stap, zodat ho_subset per selectie maar één keer doorlopen wordt.
+@st.cache_data(max_entries=SELECTION_CACHE_ENTRIES)
+def compute_aggregates(_ho_subset, filter_key):
+    per_jaar = _ho_subset.groupby('Jaar', observed=True)['Aantal'].sum()
+    huidig_jaar = int(per_jaar.index.max()) if len(per_jaar) else 2024
+
+    year_groups = group_years(_ho_subset)
+    # nlargest direct op de gegroepeerde Series; pas daarna (10 rijen) terug naar een DataFrame.
+    top_opleidingen = rows_for_year(_ho_subset, year_groups, huidig_jaar).groupby('HO naam opleiding', observed=True)['Aantal'].sum().nlargest(10)
+    return {
+        'per_jaar': per_jaar,
+        'huidig_jaar': huidig_jaar,
+        'trend_data': _ho_subset.groupby(['Jaar', bestemming_col], observed=True)['Aantal'].sum().reset_index(),
+        'sector_data': top_opleidingen.rename_axis('HO naam opleiding').reset_index(),
+        'herkomst_type': _ho_subset.groupby(['Jaar', 'Herkomst onderwijssoort'], observed=True)['Aantal'].sum().reset_index(),
+        'n_instellingen': _ho_subset[bestemming_col].nunique(),
+        'n_opleidingen': _ho_subset['HO naam opleiding'].nunique(),
+    }
+
+# Marktaandeel per bestemming in het huidige jaar, aflopend op grootte; bij meer dan 10 bestemmingen
+# de top 5 plus 'Overig'. filtered_df hangt alleen af van de uploads en de herkomst, dus die vormen de sleutel.
+@st.cache_data(max_entries=SELECTION_CACHE_ENTRIES)
+def compute_market_share(_filtered_df, data_key, herkomst, huidig_jaar):
+    year_groups = group_years(_filtered_df)
+    markt_data = rows_for_year(_filtered_df, year_groups, huidig_jaar).groupby(bestemming_col, observed=True)['Aantal'].sum()
+    markt_data = markt_data.sort_values(ascending=False).reset_index()
+    if len(markt_data) > 10:
+        top = markt_data.head(5)
+        other = pd.DataFrame({bestemming_col: ['Overig'], 'Aantal': [markt_data['Aantal'].sum() - top['Aantal'].sum()]})
+        markt_data = pd.concat([top, other], ignore_index=True)
+    return markt_data
+
+# Tabelweergave: alleen de relevante kolommen en maximaal 5000 rijen, gesorteerd één keer per selectie.
+@st.cache_data(max_entries=SELECTION_CACHE_ENTRIES)
+def preview_table(_ho_subset, filter_key, max_rows=5000):
+    tabel_cols = ['Jaar', herkomst_col, bestemming_col, 'HO naam opleiding', 'Herkomst onderwijssoort', 'Aantal']
+    tabel = _ho_subset[tabel_cols].sort_values(['Jaar', 'Aantal'], ascending=[False, False]).head(max_rows)
+    return tabel, len(_ho_subset)
+
+# CSV-export van de volledige selectie; alleen opnieuw opgebouwd als de selectie verandert.
+@st.cache_data(max_entries=CSV_CACHE_ENTRIES)
+def to_csv_bytes(_df, filter_key):
+    return _df.to_csv(index=False, sep=';').encode('utf-8')
 
 data = load_and_combine_data(uploaded_files)
+# data_key moet precies dezelfde vingerafdruk zijn als waarop load_and_combine_data cachet; anders kunnen de
+# afgeleide caches een subset van een ander (ouder) frame teruggeven dan 'data'.
+data_key = tuple(upload_fingerprint(f) for f in uploaded_files)
 
 if data is not None:
     # --- FILTERS ---
@@ -50,64 +309,62 @@ if data is not None:
     st.sidebar.subheader("Filters")
     
     # Filter op Herkomst (Standaard ROC van Twente)
-    herkomst_col = 'Herkomst naam instelling'
-    bestemming_col = 'HO naam instelling'
-    
-    alle_herkomst = sorted(data[herkomst_col].dropna().unique())
+    alle_herkomst = column_options(data, data_key, herkomst_col)
     # Zoek naar ROC van Twente in de lijst
-    default_herkomst_idx = 0
-    for i, name in enumerate(alle_herkomst):
-        if "ROC van Twente" in name:
-            default_herkomst_idx = i
-            break
+    default_herkomst_idx = next(iter(matching_options(alle_herkomst, data_key, herkomst_col, "ROC van Twente")), 0)
             
     selected_herkomst = st.sidebar.selectbox("Selecteer Herkomstinstelling", alle_herkomst, index=default_herkomst_idx)
 
     # Filter op Bestemming (Standaard Saxion)
-    alle_ho = sorted(data[bestemming_col].dropna().unique())
-    default_ho_list = [h for h in alle_ho if "Saxion" in h]
+    alle_ho = column_options(data, data_key, bestemming_col)
+    default_ho_list = [alle_ho[i] for i in matching_options(alle_ho, data_key, bestemming_col, "Saxion")]
     selected_ho = st.sidebar.multiselect("Selecteer HO Bestemming(en)", alle_ho, default=default_ho_list if default_ho_list else None)
 
     # Subset data op basis van filters
-    filtered_df = data[data[herkomst_col] == selected_herkomst]
-    ho_subset = filtered_df[filtered_df[bestemming_col].isin(selected_ho)]
+    filter_key = (data_key, selected_herkomst, tuple(sorted(selected_ho)))
+    filtered_df, ho_subset = filter_data(data, *filter_key)
+    agg = compute_aggregates(ho_subset, filter_key)
 
     # --- KPI's ---
     kpi1, kpi2, kpi3 = st.columns(3)
     
-    jaren = sorted(ho_subset['Jaar'].unique(), reverse=True)
-    huidig_jaar = jaren[0] if jaren else 2024
+    huidig_jaar = agg['huidig_jaar']
     vorig_jaar = huidig_jaar - 1
     
-    totaal_huidig = ho_subset[ho_subset['Jaar'] == huidig_jaar]['Aantal'].sum()
-    totaal_vorig = ho_subset[ho_subset['Jaar'] == vorig_jaar]['Aantal'].sum()
+    totaal_huidig = agg['per_jaar'].get(huidig_jaar, 0)
+    totaal_vorig = agg['per_jaar'].get(vorig_jaar, 0)
     
     delta = None
     if totaal_vorig > 0:
         diff = totaal_huidig - totaal_vorig
-        delta = f"{int(diff)} t.o.v. {vorig_jaar}"
+        delta = f"{diff} t.o.v. {vorig_jaar}"
 
-    kpi1.metric(f"Instroom {huidig_jaar}", f"{int(totaal_huidig)} studenten", delta)
-    kpi2.metric("Aantal HO Instellingen", len(ho_subset[bestemming_col].unique()))
-    kpi3.metric("Unieke Opleidingen", len(ho_subset['HO naam opleiding'].unique()))
+    kpi1.metric(f"Instroom {huidig_jaar}", f"{totaal_huidig} studenten", delta)
+    kpi2.metric("Aantal HO Instellingen", agg['n_instellingen'])
+    kpi3.metric("Unieke Opleidingen", agg['n_opleidingen'])
 
     # --- GRAFIEKEN ---
     col1, col2 = st.columns(2)
 
     with col1:
         st.subheader("Meerjarige Trend Instroom")
-        trend_data = ho_subset.groupby(['Jaar', bestemming_col])['Aantal'].sum().reset_index()
-        fig_trend = px.line(trend_data, x='Jaar', y='Aantal', color=bestemming_col, 
-                             markers=True, line_shape='linear',
-                             title=f"Instroom vanuit {selected_herkomst}")
+        # Direct met graph_objects: één trace per HO uit de al gegroepeerde arrays, WebGL bij veel HO's.
+        fig_trend = go.Figure()
+        for name, sub in agg['trend_data'].groupby(bestemming_col, observed=True):
+            fig_trend.add_trace(go.Scattergl(x=sub['Jaar'].to_numpy(), y=sub['Aantal'].to_numpy(),
+                                             mode='lines+markers', name=name))
+        fig_trend.update_layout(title=f"Instroom vanuit {selected_herkomst}", legend_title_text=bestemming_col,
+                                xaxis_title='Jaar', yaxis_title='Aantal')
         fig_trend.update_xaxes(dtick=1)
         st.plotly_chart(fig_trend, use_container_width=True)
 
     with col2:
         st.subheader(f"Marktaandeel Bestemming ({huidig_jaar})")
-        markt_data = filtered_df[filtered_df['Jaar'] == huidig_jaar].groupby(bestemming_col)['Aantal'].sum().reset_index()
-        fig_pie = px.pie(markt_data, values='Aantal', names=bestemming_col, 
-                         title=f"Bestemmingen van {selected_herkomst} studenten")
+        markt_data = compute_market_share(filtered_df, data_key, selected_herkomst, huidig_jaar)
+        # sort=False: de volgorde uit compute_market_share (aflopend, 'Overig' als laatste) blijft behouden.
+        fig_pie = go.Figure(go.Pie(values=markt_data['Aantal'].to_numpy(), labels=markt_data[bestemming_col].astype(str).to_numpy(),
+                                   sort=False))
+        fig_pie.update_layout(title=f"Bestemmingen van {selected_herkomst} studenten", legend_title_text=bestemming_col)
         st.plotly_chart(fig_pie, use_container_width=True)
 
     st.divider()
@@ -116,25 +373,37 @@ if data is not None:
 
     with col3:
         st.subheader(f"Top 10 Opleidingen ({huidig_jaar})")
-        sector_data = ho_subset[ho_subset['Jaar'] == huidig_jaar].groupby('HO naam opleiding')['Aantal'].sum().reset_index()
-        sector_data = sector_data.nlargest(10, 'Aantal')
-        fig_bar = px.bar(sector_data, x='Aantal', y='HO naam opleiding', orientation='h',
-                         title=f"Grootste opleidingen bij geselecteerde HO's", color='Aantal',
-                         color_continuous_scale='Viridis')
-        fig_bar.update_layout(yaxis={'categoryorder':'total ascending'})
+        sector_data = agg['sector_data']
+        fig_bar = go.Figure(go.Bar(x=sector_data['Aantal'].to_numpy(), y=sector_data['HO naam opleiding'].astype(str).to_numpy(),
+                                   orientation='h',
+                                   marker={'color': sector_data['Aantal'].to_numpy(), 'colorscale': 'Viridis',
+                                           'showscale': True, 'colorbar': {'title': 'Aantal'}}))
+        fig_bar.update_layout(title=f"Grootste opleidingen bij geselecteerde HO's", xaxis_title='Aantal',
+                              yaxis_title='HO naam opleiding', yaxis={'categoryorder':'total ascending'})
         st.plotly_chart(fig_bar, use_container_width=True)
 
     with col4:
         st.subheader("Herkomst Onderwijssoort")
-        herkomst_type = ho_subset.groupby(['Jaar', 'Herkomst onderwijssoort'])['Aantal'].sum().reset_index()
-        fig_area = px.area(herkomst_type, x='Jaar', y='Aantal', color='Herkomst onderwijssoort',
-                           title="Directe vs. Indirecte instroom trend")
+        fig_area = go.Figure()
+        for name, sub in agg['herkomst_type'].groupby('Herkomst onderwijssoort', observed=True):
+            fig_area.add_trace(go.Scatter(x=sub['Jaar'].to_numpy(), y=sub['Aantal'].to_numpy(),
+                                          mode='lines', stackgroup='one', name=name))
+        fig_area.update_layout(title="Directe vs. Indirecte instroom trend", legend_title_text='Herkomst onderwijssoort',
+                               xaxis_title='Jaar', yaxis_title='Aantal')
         fig_area.update_xaxes(dtick=1)
         st.plotly_chart(fig_area, use_container_width=True)
 
     # --- DATATABEL ---
+    # Alleen een beperkte tabel naar de browser; de volledige selectie is te downloaden.
     with st.expander("Bekijk Ruwe Data Selectie"):
-        st.dataframe(ho_subset, use_container_width=True)
+        tabel, n_rijen = preview_table(ho_subset, filter_key)
+        st.dataframe(tabel, use_container_width=True, hide_index=True)
+        if n_rijen > len(tabel):
+            st.caption(f"De eerste {len(tabel)} van {n_rijen} rijen worden getoond.")
+        # De CSV bouwen we pas op verzoek, zodat een selectiewijziging niet steeds een volledige export kost.
+        if st.toggle("CSV-download voorbereiden", key="csv_download"):
+            st.download_button("Download volledige selectie (CSV)", to_csv_bytes(ho_subset, filter_key),
+                               file_name="selectie.csv", mime="text/csv")
 
 else:
     st.info("Upload CSV-bestanden in de zijbalk om de analyse te starten.")